@@ -3,35 +3,62 @@
 python main.py server
 """
 
+import asyncio
+import os
 import time
 import threading
 import sys
-from flask import Flask, jsonify
+from concurrent.futures import ThreadPoolExecutor
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse, Response
+
+try:
+    # 選用依賴：客戶端可要求更精簡的 msgpack 二進位回應
+    import msgpack
+except ImportError:
+    msgpack = None
 from modules.video_library import VideoLibrary
 from modules.obs_controller import OBSController
+from modules.utils import setup_queue_logging
 from obswebsocket import exceptions, events
 
 # ----------------------------------------------------------
 # 主程式示範
 # ----------------------------------------------------------
 
-# --- 全域變數，供 Flask 路由使用 ---
-app = Flask(__name__)
+# --- 全域變數，供 FastAPI 路由使用 ---
+# 回應一律走 orjson 序列化，比預設的 json.dumps 快上數倍
+app = FastAPI(default_response_class=ORJSONResponse)
 library: VideoLibrary = None
 obs_controller: OBSController = None
 
-@app.route('/play/<string:tag_type>', methods=['POST', 'GET'])
-def play_video(tag_type: str):
+# 事件回呼走非阻塞 logger，避免主控台 flush 卡住 OBS 事件分派執行緒
+log = setup_queue_logging()
+
+# 專用的請求執行緒池：固定 8 條執行緒處理 /play 指令，
+# 避免突發請求時不斷擴張預設執行緒池
+request_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="play-req")
+
+@app.api_route('/play/{tag_type}', methods=['POST', 'GET'])
+async def play_video(tag_type: str, request: Request):
     """
-    Flask 路由，接收來自 Streamer.bot 的指令。
+    FastAPI 路由，接收來自 Streamer.bot 的指令。
     例如，Streamer.bot 呼叫 http://127.0.0.1:5678/play/opening
     """
     # 將請求委託給 OBSController 處理
-    result = obs_controller.handle_play_request(tag_type)
-    
+    # handle_play_request 內含多次阻塞的 OBS RPC，丟到專用執行緒池執行，
+    # 讓事件迴圈在等待期間能繼續處理其他請求
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(request_executor, obs_controller.handle_play_request, tag_type)
+
     # 根據回傳的 code 設定 HTTP 狀態碼
     status_code = result.get("code", 200)
-    return jsonify(result), status_code
+
+    # 內容協商：客戶端以 Accept 指明 msgpack 時，改回傳二進位格式
+    if msgpack is not None and request.headers.get("accept") == "application/msgpack":
+        return Response(content=msgpack.packb(result), status_code=status_code, media_type="application/msgpack")
+    return ORJSONResponse(content=result, status_code=status_code)
 
 def run_playback_test(tag: str):
     """一個獨立的測試函式，用於快速驗證播放流程。"""
@@ -55,6 +82,21 @@ def run_playback_test(tag: str):
         # 注入 library，讓 controller 能讀取設定與影片
         local_obs_controller.set_library(local_library)
 
+        # 測試模式也要接媒體播放事件：否則等待媒體長度時只能
+        # 白等事件逾時才退回輪詢，每次播放固定多卡 ~1 秒
+        def on_media_state(message):
+            if message.getInputName() != local_obs_controller.SOURCE_MEDIA:
+                return
+            state = message.getMediaState()
+            if state == "OBS_MEDIA_STATE_PLAYING":
+                local_obs_controller.notify_media_started()
+            elif (state == "OBS_MEDIA_STATE_ENDED"
+                    and not local_obs_controller.is_timed_playback
+                    and local_obs_controller.is_standby_mode):
+                # 讓互動模式的待機循環也能靠結束事件接續下一部
+                local_obs_controller.notify_standby_continue()
+        local_obs_controller.register_event_handler(events.MediaInputPlaybackStateChanged, on_media_state)
+
         # 特殊處理待機循環測試
         if tag == "待機":
             print("🔄 啟動待機循環模式...")
@@ -114,16 +156,21 @@ def main():
         # 3. 註冊 OBS 事件處理器
         print("Registering OBS event handlers...")
         def on_scene_changed(message):
-            print(f"📢 OBS 事件: 場景已切換到 '{message.getSceneName()}'")
+            log.info(f"📢 OBS 事件: 場景已切換到 '{message.getSceneName()}'")
+            # 同步更新控制器的場景快取，省去之後查詢場景的 RTT
+            obs_controller.on_program_scene_changed(message.getSceneName())
         def on_media_input_playback_state_changed(message):
             state = message.getMediaState()
-            print(f"📢 OBS 事件: 媒體來源 '{message.getInputName()}' 播放狀態變更為 '{state}'")
+            log.info(f"📢 OBS 事件: 媒體來源 '{message.getInputName()}' 播放狀態變更為 '{state}'")
+            # 播放開始時喚醒等待媒體長度的執行緒 (取代輪詢)
+            if message.getInputName() == obs_controller.SOURCE_MEDIA and state == "OBS_MEDIA_STATE_PLAYING":
+                obs_controller.notify_media_started()
             # 只有在非計時播放（即播放完整影片）的情況下，才由這個事件觸發切換
             if message.getInputName() == obs_controller.SOURCE_MEDIA and state == "OBS_MEDIA_STATE_ENDED":
                 
                 # --- 防止衝突邏輯：檢查是否需要忽略此事件 ---
                 if obs_controller.ignore_end_event_counter > 0:
-                    print(f"🛡️ 忽略舊影片的結束事件 (剩餘忽略次數: {obs_controller.ignore_end_event_counter - 1})")
+                    log.info(f"🛡️ 忽略舊影片的結束事件 (剩餘忽略次數: {obs_controller.ignore_end_event_counter - 1})")
                     obs_controller.ignore_end_event_counter -= 1
                     return
                 # ------------------------------------
@@ -132,32 +179,35 @@ def main():
                     
                     # 檢查是否處於待機循環模式
                     if obs_controller.is_standby_mode:
-                        print(f"🔄 待機循環 (事件觸發)：播放下一部影片...")
-                        if obs_controller.standby_callback:
-                            # 使用執行緒避免阻塞事件處理
-                            threading.Thread(target=obs_controller.standby_callback).start()
+                        log.info(f"🔄 待機循環 (事件觸發)：播放下一部影片...")
+                        # 只是設定事件喚醒常駐的待機迴圈，不會阻塞事件處理
+                        obs_controller.notify_standby_continue()
                         return
 
                     target = obs_controller.current_target_scene or obs_controller.SCENE_PREVIEW
                     preview_target = obs_controller.current_preview_target
                     
-                    print(f"✅ 影片自然播放結束，自動切換回場景 '{target}'")
+                    log.info(f"✅ 影片自然播放結束，自動切換回場景 '{target}'")
                     obs_controller.set_current_scene(target)
                     if preview_target:
-                        # 使用執行緒來執行延遲設定，避免阻塞事件處理迴圈，並等待轉場完成
+                        # 丟到共用執行緒池執行延遲設定，避免阻塞事件處理迴圈，並等待轉場完成
                         def set_preview_delayed():
                             time.sleep(0.5)
-                            print(f"   同時設定預覽場景為 '{preview_target}'")
+                            log.info(f"   同時設定預覽場景為 '{preview_target}'")
                             obs_controller.set_current_preview_scene(preview_target)
-                        threading.Thread(target=set_preview_delayed).start()
+                        obs_controller._worker.submit(set_preview_delayed)
+        def on_scene_list_changed(message):
+            # 場景清單變動 (新增/刪除/改名) 時讓名稱快取失效，下次使用時重新拉取
+            obs_controller.invalidate_scene_cache()
         obs_controller.register_event_handler(events.CurrentProgramSceneChanged, on_scene_changed)
         obs_controller.register_event_handler(events.MediaInputPlaybackStateChanged, on_media_input_playback_state_changed)
+        obs_controller.register_event_handler(events.SceneListChanged, on_scene_list_changed)
 
-        # 4. 啟動 Flask 伺服器來接收指令
+        # 4. 啟動 Uvicorn 伺服器來接收指令
         print("\n--- Python OBS Controller is running ---")
         print("Listening for commands at http://127.0.0.1:5678")
         print("Press CTRL+C to exit.")
-        app.run(host='127.0.0.1', port=5678)
+        uvicorn.run(app, host='127.0.0.1', port=5678, log_level="warning")
 
     except (ValueError, FileNotFoundError, exceptions.ConnectionFailure) as e:
         print(f"❌ 啟動失敗: {e}")
@@ -175,19 +225,27 @@ if __name__ == "__main__":
         main()
     else:
         # 互動式測試模式
+        temp_lib = None
+        lib_mtime = None
+        all_tags = []
         while True:
             try:
                 print("\n--- 互動測試模式 ---")
-                temp_lib = VideoLibrary("video_event.json")
-                
-                all_tags = []
-                seen_tags = set()
-                for v in temp_lib._videos:
-                    for tag in v.get("tags", {}):
-                        if tag not in seen_tags:
-                            seen_tags.add(tag)
-                            all_tags.append(tag)
-                
+                # 只在第一次或設定檔 mtime 變更時重新載入，重複測試不必重建快取
+                current_mtime = os.path.getmtime("video_event.json")
+                if temp_lib is None or current_mtime != lib_mtime:
+                    temp_lib = VideoLibrary("video_event.json")
+                    lib_mtime = current_mtime
+
+                    all_tags = []
+                    seen_tags = set()
+                    for v in temp_lib._videos:
+                        for tag in v.get("tags", {}):
+                            if tag not in seen_tags:
+                                seen_tags.add(tag)
+                                all_tags.append(tag)
+
+
                 if not all_tags:
                     print("❌ 在 video_event.json 中找不到任何可用的標籤。")
                     input("按 Enter 鍵離開...")
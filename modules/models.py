@@ -4,15 +4,19 @@
           主要包含 VideoSegment 類別，用於標準化影片片段的資訊傳遞。
 """
 import os
+from dataclasses import dataclass
 from typing import Union
 
+@dataclass(slots=True, frozen=True)
 class VideoSegment:
-    """一個資料類別，用來存放影片片段的資訊。"""
-    def __init__(self, file_path: str, start_time: Union[float, str], end_time: Union[float, str], volume_multiplier: float = 1.0):
-        self.file_path = file_path
-        self.start_time = start_time
-        self.end_time = end_time
-        self.volume_multiplier = volume_multiplier
+    """一個資料類別，用來存放影片片段的資訊。
+
+    使用 slots 省去每個實例的 __dict__ 開銷；片段一旦建立即不可變。
+    """
+    file_path: str
+    start_time: Union[float, str]
+    end_time: Union[float, str]
+    volume_multiplier: float = 1.0
 
     def __repr__(self) -> str:
         """提供一個清晰的物件字串表示法，方便除錯。"""
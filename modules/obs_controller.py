@@ -5,24 +5,41 @@
 """
 
 import sys
+import json
 import time
+import uuid
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional
 from obswebsocket import obsws, requests, exceptions
 from .models import VideoSegment
+from .utils import setup_queue_logging
+
+# 非阻塞 logger：訊息進佇列後由背景執行緒輸出，避免主控台 I/O 卡住熱路徑
+log = setup_queue_logging()
 
 class OBSController:
     """負責連線並控制 OBS 的類別。"""
     def __init__(self, host: str, port: int, password: str):
         self._ws = obsws(host, port, password)
+        self._ws_lock = threading.RLock() # 新增：websocket 互斥鎖，底層客戶端並非執行緒安全
         self._is_connected = False
         self.is_timed_playback = False # 新增旗標，用於追蹤是否為計時播放
-        self.active_timer_thread = None # 新增：追蹤當前的計時器執行緒
+        self._timer_cancel: Optional[threading.Event] = None # 新增：當前計時器的取消事件
         self.current_target_scene = None # 新增：儲存本次播放結束後要切換的目標場景
         self.current_preview_target = None # 新增：儲存本次播放結束後要設定的預覽場景
-        self.is_standby_mode = False # 新增：標記是否處於待機循環模式
-        self.standby_callback = None # 新增：待機循環的回呼函式
+        self._standby_running = False # 新增：標記是否處於待機循環模式
+        self._standby_next_event = threading.Event() # 新增：喚醒待機迴圈播放下一部的事件
+        self._standby_thread = None # 新增：常駐的待機工作執行緒
         self.library = None # 新增：持有 VideoLibrary 的參照
+        self._scene_item_id_cache = {} # 新增：(場景, 來源) -> scene item ID 快取，場景項目在執行期間不會變動
+        self._current_scene_cached: Optional[str] = None # 新增：當前節目場景快取，由場景變更事件維護
+        self._known_scenes: Optional[set] = None # 新增：已知場景名稱集合，驗證場景存在時不必再拉整份場景清單
+        self._media_started_event = threading.Event() # 新增：媒體開始播放的事件，取代輪詢等待
+        # 事件回呼用的共用執行緒池，避免每次事件都新建執行緒
+        self._worker = ThreadPoolExecutor(max_workers=2, thread_name_prefix="obs-cb")
+        # 專用的 websocket I/O 執行緒：所有 RPC 都在這條執行緒上送出
+        self._ws_io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="obs-ws-io")
         
         # 場景與來源設定 (將在 set_library 中載入)
         self.SCENE_MAIN = ""
@@ -33,24 +50,88 @@ class OBSController:
         self.SOURCE_BG_PREVIEW = ""
         self.obs_settings = {}
 
+    def _call(self, request):
+        """(私有方法) 統一的 websocket 呼叫入口。
+
+        所有 RPC 都轉送到專用的 I/O 執行緒上執行，呼叫端阻塞等待 future 結果。
+        如此請求執行緒、計時器執行緒與事件執行緒不必再爭奪同一把鎖，
+        等待期間只是停在 future 上 (會釋放 GIL)，傳送順序也自然序列化。
+        """
+        if threading.current_thread().name.startswith("obs-ws-io"):
+            return self._call_direct(request)
+        return self._ws_io.submit(self._call_direct, request).result()
+
+    def _call_direct(self, request):
+        """(私有方法) 在 I/O 執行緒上實際執行 websocket 呼叫，以互斥鎖保護。"""
+        with self._ws_lock:
+            return self._ws.call(request)
+
+    def _call_batch(self, request_list):
+        """(私有方法) 以 obs-websocket v5 的 RequestBatch 一次送出多個請求。
+
+        底層客戶端沒有批次 API，因此直接組出原始的 op 8 訊框 (SERIAL_REALTIME)，
+        讓整串寫入請求只花一次網路往返。與 _call 相同，實際傳送一律轉送到
+        專用的 I/O 執行緒上，維持「只有一條執行緒碰連線」的不變量。
+        """
+        if threading.current_thread().name.startswith("obs-ws-io"):
+            return self._call_batch_direct(request_list)
+        return self._ws_io.submit(self._call_batch_direct, request_list).result()
+
+    def _call_batch_direct(self, request_list):
+        """(私有方法) 在 I/O 執行緒上組出並送出 op 8 訊框。
+
+        每個批次項目必須帶 requestType 與 requestData：客戶端的 data()
+        只回傳參數字典，requestType 得自己補上 (對照 obsws.call 的包裝)。
+        送出後以一個輕量 RPC 當探針：同一條連線上的訊息依序處理，探針有
+        回應代表批次訊框已被伺服器接受；訊框無效時伺服器會關閉連線、
+        探針失敗，此時退回逐一呼叫，行為與原本相同。個別請求的 op 9
+        結果由客戶端的 RecvThread 以 Unknown message 記錄供除錯。
+        """
+        try:
+            payload = {
+                "op": 8,
+                "d": {
+                    "requestId": str(uuid.uuid4()),
+                    "haltOnFailure": False,
+                    "executionType": 0, # SERIAL_REALTIME
+                    "requests": [
+                        {"requestType": req.name, "requestData": req.data()}
+                        for req in request_list
+                    ],
+                },
+            }
+            with self._ws_lock:
+                self._ws.ws.send(json.dumps(payload))
+            # 探針多花一次 RTT，但整批寫入仍是兩個訊框，而非每個請求各一次往返
+            self._call_direct(requests.GetVersion())
+        except Exception as e:
+            log.warning(f"⚠️ 批次請求失敗，退回逐一呼叫: {e}")
+            for req in request_list:
+                try:
+                    self._call_direct(req)
+                except Exception:
+                    pass
+
     def connect(self):
         """連線到 OBS WebSocket。"""
         try:
-            self._ws.connect()
+            with self._ws_lock:
+                self._ws.connect()
             self._is_connected = True
-            print("✅ 成功連線到 OBS WebSocket。")
+            log.info("✅ 成功連線到 OBS WebSocket。")
         except exceptions.ConnectionFailure as e:
-            print(f"❌ 無法連線到 OBS WebSocket: {e}")
+            log.error(f"❌ 無法連線到 OBS WebSocket: {e}")
             sys.exit(1)
 
     def disconnect(self):
         """中斷與 OBS WebSocket 的連線。"""
         if not self._is_connected:
             return
-        self._ws.disconnect()
-        self.active_timer_thread = None
+        with self._ws_lock:
+            self._ws.disconnect()
+        self._cancel_active_timer()
         self._is_connected = False
-        print("🔌 已中斷與 OBS WebSocket 的連線。")
+        log.info("🔌 已中斷與 OBS WebSocket 的連線。")
 
     def set_library(self, library):
         """
@@ -59,8 +140,12 @@ class OBSController:
         """
         self.library = library
         self._parse_scene_settings()
-        # 設定待機回呼指向自身的 play_standby_video 方法
-        self.standby_callback = self.play_standby_video
+        # 預熱場景項目 ID 快取，避免播放時才付出 RTT 成本
+        for source in (self.SOURCE_BG_MAIN, self.SOURCE_BG_PREVIEW):
+            try:
+                self._get_scene_item_id(self.SCENE_EVENT, source)
+            except Exception:
+                pass
 
     def _parse_scene_settings(self):
         """(私有方法) 從 library 設定中解析場景與來源名稱，儲存為實例變數。"""
@@ -78,7 +163,7 @@ class OBSController:
         self.SOURCE_BG_PREVIEW = scenes["obs_event"]["sources"].get("transition_preview", self.SCENE_PREVIEW)
         
         self.obs_settings = obs_settings
-        print(f"✅ OBS 控制器已載入場景設定: 主畫面='{self.SCENE_MAIN}', 事件='{self.SCENE_EVENT}'")
+        log.info(f"✅ OBS 控制器已載入場景設定: 主畫面='{self.SCENE_MAIN}', 事件='{self.SCENE_EVENT}'")
 
     def calculate_ab_transition(self, current_scene: str) -> Dict[str, str]:
         """
@@ -102,15 +187,68 @@ class OBSController:
                 "hide_source": self.SOURCE_BG_PREVIEW
             }
 
-    def play_standby_video(self):
-        """
-        播放待機影片 (循環邏輯)。
-        此方法會被計時器或事件回呼重複呼叫，形成無限循環。
+    @property
+    def is_standby_mode(self) -> bool:
+        """是否處於待機循環模式。指派 True/False 等同呼叫 start_standby/stop_standby。"""
+        return self._standby_running
+
+    @is_standby_mode.setter
+    def is_standby_mode(self, value: bool):
+        if value:
+            self.start_standby()
+        else:
+            self.stop_standby()
+
+    def start_standby(self):
+        """啟動待機循環：由單一常駐工作執行緒依序播放待機影片。"""
+        if self._standby_running:
+            return
+        self._standby_running = True
+        self._standby_next_event.set() # 讓迴圈立刻播放第一部
+        self._standby_thread = threading.Thread(target=self._standby_loop, daemon=True)
+        self._standby_thread.start()
+
+    def stop_standby(self):
+        """停止待機循環，喚醒並等待工作執行緒結束。"""
+        if not self._standby_running:
+            return
+        self._standby_running = False
+        self._standby_next_event.set()
+        # 必須等舊執行緒真正退出：若緊接著 start_standby，醒來的舊執行緒
+        # 會看到旗標又變回 True 而繼續運轉，變成兩條迴圈並存、每次各播一部
+        thread = self._standby_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=2.0)
+        self._standby_thread = None
+
+    def notify_standby_continue(self):
+        """由計時器或媒體結束事件呼叫，喚醒待機迴圈播放下一部影片。"""
+        if self._standby_running:
+            self._standby_next_event.set()
+
+    def _standby_loop(self):
+        """(私有方法) 常駐待機工作迴圈：等待喚醒 → 播放下一部待機影片。
+
+        單一執行緒取代了舊有「計時器 → 回呼 → 再生計時器」的遞迴式執行緒鏈。
         """
+        while True:
+            self._standby_next_event.wait()
+            self._standby_next_event.clear()
+            # 防呆：join 逾時後殘留的舊執行緒不得續跑，
+            # 並把剛清掉的喚醒還給目前登記的工作執行緒
+            if self._standby_thread is not threading.current_thread():
+                self._standby_next_event.set()
+                return
+            if not self._standby_running:
+                return
+            self.play_standby_video()
+
+    def play_standby_video(self):
+        """播放一部待機影片 (由待機工作迴圈呼叫)。"""
         if not self.library: return
         try:
             segment = self.library.get_random_segment_by_tag("待機")
-            print(f"🔄 播放待機影片: {segment}")
+            log.info(f"🔄 播放待機影片: {segment}")
             # 待機模式下，目標場景設為 SCENE_MAIN (作為停止時的預設返回場景)
             # 預覽場景設為 SCENE_PREVIEW，確保 A/B 邏輯在待機結束後能正確銜接
             self.play_video_segment(
@@ -122,25 +260,24 @@ class OBSController:
                 preview_target_scene_name=self.SCENE_PREVIEW
             )
         except Exception as e:
-            print(f"❌ 播放待機影片失敗: {e}")
+            log.error(f"❌ 播放待機影片失敗: {e}")
 
     def handle_play_request(self, tag_type: str) -> Dict[str, Any]:
         """
         處理來自外部 (如 API) 的播放請求。
         包含待機模式切換、影片選取、A/B 場景計算與播放指令下達。
         """
-        print(f"\nReceived request to play tag: {tag_type}")
+        log.info(f"\nReceived request to play tag: {tag_type}")
         
         # 1. 處理待機指令
         if tag_type == "待機":
-            self.is_standby_mode = True
-            self.play_standby_video()
+            self.start_standby()
             return {"status": "success", "message": "Started standby loop", "code": 200}
 
         # 2. 處理一般指令 (打斷待機)
         if self.is_standby_mode:
-            print("🛑 收到新指令，停止待機循環。")
-            self.is_standby_mode = False
+            log.info("🛑 收到新指令，停止待機循環。")
+            self.stop_standby()
 
         if not self.library:
              return {"status": "error", "message": "Library not initialized", "code": 500}
@@ -148,7 +285,7 @@ class OBSController:
         try:
             # 3. 選取影片
             selected_segment = self.library.get_random_segment_by_tag(tag_type)
-            print(f"✅ 已為標籤 '{tag_type}' 選擇影片: {selected_segment}")
+            log.info(f"✅ 已為標籤 '{tag_type}' 選擇影片: {selected_segment}")
 
             # 4. 計算 A/B 場景
             current_scene = self.get_current_program_scene()
@@ -162,7 +299,8 @@ class OBSController:
                 selected_segment,
                 target_scene_name=transition_data["target_scene"],
                 preview_target_scene_name=transition_data["preview_scene"],
-                source_to_hide=transition_data["hide_source"]
+                source_to_hide=transition_data["hide_source"],
+                current_scene=current_scene
             )
             return {
                 "status": "success", 
@@ -171,136 +309,201 @@ class OBSController:
                 "code": 200
             }
         except ValueError as e:
-            print(f"❌ 錯誤: {e}")
+            log.error(f"❌ 錯誤: {e}")
             return {"status": "error", "message": str(e), "code": 404}
         except Exception as e:
-            print(f"❌ 伺服器內部錯誤: {e}")
+            log.error(f"❌ 伺服器內部錯誤: {e}")
             return {"status": "error", "message": f"An internal error occurred: {e}", "code": 500}
 
     def register_event_handler(self, event_type, handler_func):
         """註冊 OBS WebSocket 事件處理器。"""
         self._ws.register(handler_func, event_type)
-        print(f"👂 已註冊 '{event_type}' 事件處理器。")
+        log.info(f"👂 已註冊 '{event_type}' 事件處理器。")
 
     def get_current_program_scene(self):
-        """取得當前的主場景名稱"""
+        """取得當前的主場景名稱 (優先使用事件維護的快取，僅首次查詢 OBS)。"""
+        if self._current_scene_cached is not None:
+            return self._current_scene_cached
         try:
-            return self._ws.call(requests.GetCurrentProgramScene()).getCurrentProgramSceneName()
+            scene = self._call(requests.GetCurrentProgramScene()).getCurrentProgramSceneName()
+            self._current_scene_cached = scene
+            return scene
         except Exception as e:
-            print(f"❌ 無法取得當前場景: {e}")
+            log.error(f"❌ 無法取得當前場景: {e}")
             return None
 
+    def on_program_scene_changed(self, scene_name: str):
+        """由場景變更事件呼叫，更新本地的場景快取。"""
+        self._current_scene_cached = scene_name
+
+    def _refresh_known_scenes(self):
+        """(私有方法) 向 OBS 拉取一次場景清單，建立場景名稱集合快取。"""
+        scene_list = self._call(requests.GetSceneList())
+        self._known_scenes = {s['sceneName'] for s in scene_list.getScenes()}
+
+    def invalidate_scene_cache(self):
+        """由場景清單變更事件呼叫，下次驗證時會重新向 OBS 拉取清單。"""
+        self._known_scenes = None
+
     def set_current_scene(self, scene_name: str):
-        """更安全地設定當前節目場景，會先檢查場景是否存在。"""
+        """更安全地設定當前節目場景，會先檢查場景是否存在 (以快取的名稱集合驗證)。"""
         try:
-            scene_list = self._ws.call(requests.GetSceneList())
-            if any(s['sceneName'] == scene_name for s in scene_list.getScenes()):
-                self._ws.call(requests.SetCurrentProgramScene(sceneName=scene_name))
+            if self._known_scenes is None:
+                self._refresh_known_scenes()
+            if scene_name in self._known_scenes:
+                self._call(requests.SetCurrentProgramScene(sceneName=scene_name))
+                self._current_scene_cached = scene_name
             else:
-                print(f"❌ 警告：嘗試切換到一個不存在的場景 '{scene_name}'。操作已取消。")
+                log.error(f"❌ 警告：嘗試切換到一個不存在的場景 '{scene_name}'。操作已取消。")
         except Exception as e:
-            print(f"❌ 切換場景時發生錯誤: {e}")
+            log.error(f"❌ 切換場景時發生錯誤: {e}")
 
     def set_current_preview_scene(self, scene_name: str):
         """設定當前預覽場景 (Studio Mode)。"""
         try:
-            self._ws.call(requests.SetCurrentPreviewScene(sceneName=scene_name))
+            self._call(requests.SetCurrentPreviewScene(sceneName=scene_name))
         except Exception as e:
-            print(f"⚠️ 無法設定預覽場景 (可能未開啟 Studio Mode): {e}")
+            log.warning(f"⚠️ 無法設定預覽場景 (可能未開啟 Studio Mode): {e}")
+
+    def _get_scene_item_id(self, scene_name: str, source_name: str) -> int:
+        """(私有方法) 取得來源在場景中的項目 ID，結果會快取以省去重複的 RTT。"""
+        key = (scene_name, source_name)
+        if key not in self._scene_item_id_cache:
+            item_id = self._call(requests.GetSceneItemId(sceneName=scene_name, sourceName=source_name)).getSceneItemId()
+            self._scene_item_id_cache[key] = item_id
+        return self._scene_item_id_cache[key]
+
+    def notify_media_started(self):
+        """由媒體播放狀態事件呼叫，喚醒等待媒體長度的執行緒。"""
+        self._media_started_event.set()
+
+    def _wait_for_media_duration(self, source_name: str, max_retries: int = 8) -> int:
+        """(私有方法) 嘗試獲取媒體長度。
 
-    def _wait_for_media_duration(self, source_name: str, max_retries: int = 20) -> int:
-        """(私有方法) 嘗試獲取媒體長度，帶有重試機制。"""
+        優先等待「播放已開始」事件 (此時 OBS 必然已知長度)；
+        事件逾時才退回指數退避輪詢 (10/20/40/80ms)。
+        """
+        if self._media_started_event.wait(timeout=1.0):
+            try:
+                duration = self._call(requests.GetMediaInputStatus(inputName=source_name)).getMediaDuration()
+                if duration is not None and duration > 0:
+                    return duration
+            except Exception:
+                pass
+        delay = 0.01
         for i in range(max_retries):
             try:
-                time.sleep(0.05)
-                status = self._ws.call(requests.GetMediaInputStatus(inputName=source_name))
+                status = self._call(requests.GetMediaInputStatus(inputName=source_name))
                 duration = status.getMediaDuration()
                 if duration is not None and duration > 0:
                     return duration
             except Exception:
                 pass
+            time.sleep(delay)
+            delay = min(delay * 2, 0.08)
         return -1
 
-    def _timer_worker(self, delay: float, target_scene: str, preview_target: str):
-        """(私有方法) 計時器執行緒的工作函式。"""
-        time.sleep(0.1)
-        if threading.current_thread() != self.active_timer_thread:
+    def _seek_media_cursor(self, source_name: str, position_ms: int, max_retries: int = 5, tolerance_ms: int = 50):
+        """(私有方法) 設定媒體播放位置，並驗證游標；只有偏差過大時才重試。"""
+        for i in range(max_retries):
+            self._call(requests.SetMediaInputCursor(inputName=source_name, mediaCursor=position_ms))
+            try:
+                cursor = self._call(requests.GetMediaInputStatus(inputName=source_name)).getMediaCursor()
+            except Exception:
+                cursor = None
+            if cursor is not None and abs(cursor - position_ms) <= tolerance_ms:
+                return
+            log.info(f"   游標偏差過大，重新設定開始時間 ({i+1}/{max_retries})...")
+            time.sleep(0.02)
+
+    def _cancel_active_timer(self):
+        """(私有方法) 取消尚未到期的計時器 (若有)，讓舊的計時器執行緒立即退出。"""
+        if self._timer_cancel is not None:
+            self._timer_cancel.set()
+            self._timer_cancel = None
+
+    def _timer_worker(self, cancel_event: threading.Event, delay: float, target_scene: str, preview_target: str):
+        """(私有方法) 計時器執行緒的工作函式。
+
+        以可取消的事件等待取代 sleep + 執行緒身分檢查：
+        被新的播放取代時，wait 會立即回傳 True，執行緒馬上結束。
+        """
+        if cancel_event.wait(timeout=delay):
             return
 
-        sleep_time = delay - 0.1
-        if sleep_time > 0:
-            time.sleep(sleep_time)
-        
         if self.is_standby_mode:
-            print(f"🔄 待機循環：播放下一部影片...")
-            if self.standby_callback:
-                self.standby_callback()
+            log.info(f"🔄 待機循環：播放下一部影片...")
+            self.notify_standby_continue()
             return
 
-        print(f"✅ 時間到，自動切換回場景 '{target_scene}'")
+        log.info(f"✅ 時間到，自動切換回場景 '{target_scene}'")
         self.set_current_scene(target_scene)
         
         if preview_target:
             time.sleep(0.5)
-            print(f"   同時設定預覽場景為 '{preview_target}'")
+            log.info(f"   同時設定預覽場景為 '{preview_target}'")
             self.set_current_preview_scene(preview_target)
-            
-        self.active_timer_thread = None
 
-    def play_video_segment(self, scene_name: str, source_name: str, background_source_name: str, segment: VideoSegment, target_scene_name: str, preview_target_scene_name: str = None, source_to_hide: str = None):
-        """在指定的場景和來源中播放影片片段。"""
-        print(f"🎬 執行播放指令：")
-        print(f"   影片路徑: {segment.file_path}")
+    def play_video_segment(self, scene_name: str, source_name: str, background_source_name: str, segment: VideoSegment, target_scene_name: str, preview_target_scene_name: str = None, source_to_hide: str = None, current_scene: str = None):
+        """在指定的場景和來源中播放影片片段。
+
+        呼叫端若已查過當前場景，可透過 current_scene 傳入以省去一次 RTT。
+        """
+        log.info(f"🎬 執行播放指令：")
+        log.info(f"   影片路徑: {segment.file_path}")
         
+        # 新的播放取代任何尚未到期的計時器
+        self._cancel_active_timer()
         self.is_timed_playback = False
         self.current_target_scene = target_scene_name
         self.current_preview_target = preview_target_scene_name
 
+        # 準備好所有設定用的寫入請求，一次批次送出 (單一 RTT)
+        setup_requests = []
         if source_to_hide:
             try:
-                item_id = self._ws.call(requests.GetSceneItemId(sceneName=scene_name, sourceName=source_to_hide)).getSceneItemId()
-                self._ws.call(requests.SetSceneItemEnabled(sceneName=scene_name, sceneItemId=item_id, sceneItemEnabled=False))
+                item_id = self._get_scene_item_id(scene_name, source_to_hide)
+                setup_requests.append(requests.SetSceneItemEnabled(sceneName=scene_name, sceneItemId=item_id, sceneItemEnabled=False))
             except Exception:
                 pass
 
         try:
-            print(f"   設定背景: 顯示 '{background_source_name}' (隱藏 '{source_to_hide}')...")
-            item_id = self._ws.call(requests.GetSceneItemId(sceneName=scene_name, sourceName=background_source_name)).getSceneItemId()
-            self._ws.call(requests.SetSceneItemEnabled(sceneName=scene_name, sceneItemId=item_id, sceneItemEnabled=True))
+            log.info(f"   設定背景: 顯示 '{background_source_name}' (隱藏 '{source_to_hide}')...")
+            item_id = self._get_scene_item_id(scene_name, background_source_name)
+            setup_requests.append(requests.SetSceneItemEnabled(sceneName=scene_name, sceneItemId=item_id, sceneItemEnabled=True))
         except Exception as e:
-            print(f"⚠️ 警告：無法啟用背景來源 '{background_source_name}'。錯誤: {e}")
+            log.warning(f"⚠️ 警告：無法啟用背景來源 '{background_source_name}'。錯誤: {e}")
 
-        print(f"   預先靜音 '{source_name}'...")
-        self._ws.call(requests.SetInputMute(inputName=source_name, inputMuted=True))
+        log.info(f"   預先靜音 '{source_name}' 並設定檔案路徑與音量 ({segment.volume_multiplier}x)...")
+        setup_requests.append(requests.SetInputMute(inputName=source_name, inputMuted=True))
+        setup_requests.append(requests.SetInputSettings(inputName=source_name, inputSettings={'local_file': segment.file_path}))
+        setup_requests.append(requests.SetInputVolume(inputName=source_name, inputVolumeMul=segment.volume_multiplier))
+        self._call_batch(setup_requests)
 
-        print(f"   設定來源 '{source_name}' 的檔案路徑...")
-        self._ws.call(requests.SetInputSettings(inputName=source_name, inputSettings={'local_file': segment.file_path}))
-
-        print(f"   設定音量倍率: {segment.volume_multiplier}x")
-        self._ws.call(requests.SetInputVolume(inputName=source_name, inputVolumeMul=segment.volume_multiplier))
-
-        current_scene = self.get_current_program_scene()
+        if current_scene is None:
+            current_scene = self.get_current_program_scene()
         if current_scene != scene_name:
-            print(f"   切換到場景 '{scene_name}'...")
-            self._ws.call(requests.SetCurrentProgramScene(sceneName=scene_name))
+            log.info(f"   切換到場景 '{scene_name}'...")
+            self._call(requests.SetCurrentProgramScene(sceneName=scene_name))
+            self._current_scene_cached = scene_name
             time.sleep(0.1)
         else:
-            print(f"   已在場景 '{scene_name}'，跳過切換動作。")
+            log.info(f"   已在場景 '{scene_name}'，跳過切換動作。")
 
         if isinstance(segment.start_time, (int, float)):
-            start_milliseconds = int(segment.start_time * 1000)
-            for i in range(5):
-                print(f"   嘗試設定開始時間 ({i+1}/5): {segment.start_time} 秒")
-                self._ws.call(requests.SetMediaInputCursor(inputName=source_name, mediaCursor=start_milliseconds))
-                time.sleep(0.02)
+            log.info(f"   設定開始時間: {segment.start_time} 秒")
+            self._seek_media_cursor(source_name, int(segment.start_time * 1000))
 
-        print(f"   恢復 '{source_name}' 音訊並播放...")
-        self._ws.call(requests.SetInputMute(inputName=source_name, inputMuted=False))
-        self._ws.call(requests.TriggerMediaInputAction(inputName=source_name, mediaAction="OBS_WEBSOCKET_MEDIA_INPUT_ACTION_PLAY"))
+        log.info(f"   恢復 '{source_name}' 音訊並播放...")
+        self._media_started_event.clear() # 播放前先清除，等待本次的開始事件
+        self._call_batch([
+            requests.SetInputMute(inputName=source_name, inputMuted=False),
+            requests.TriggerMediaInputAction(inputName=source_name, mediaAction="OBS_WEBSOCKET_MEDIA_INPUT_ACTION_PLAY"),
+        ])
 
         media_duration_ms = self._wait_for_media_duration(source_name)
         if media_duration_ms <= 0:
-            print(f"⚠️ 警告：無法獲取影片 '{source_name}' 的長度 (嘗試 20 次失敗)，將退回完整播放模式。")
+            log.warning(f"⚠️ 警告：無法獲取影片 '{source_name}' 的長度 (重試已達上限)，將退回完整播放模式。")
 
         commanded_start_sec = segment.start_time if isinstance(segment.start_time, (int, float)) else 0.0
         end_sec = segment.end_time if isinstance(segment.end_time, (int, float)) else (-1.0)
@@ -309,7 +512,7 @@ class OBSController:
 
         if end_sec > 0:
             try:
-                status = self._ws.call(requests.GetMediaInputStatus(inputName=source_name))
+                status = self._call(requests.GetMediaInputStatus(inputName=source_name))
                 actual_start_ms = status.getMediaCursor()
             except Exception:
                 actual_start_ms = None
@@ -317,11 +520,12 @@ class OBSController:
             play_duration = (end_sec - actual_start_sec) + 0.2
 
             if play_duration > 0:
-                print(f"   期望從 {commanded_start_sec:.2f}s 開始，實際從 {actual_start_sec:.2f}s 開始，播放 {play_duration:.2f} 秒後結束。")
+                log.info(f"   期望從 {commanded_start_sec:.2f}s 開始，實際從 {actual_start_sec:.2f}s 開始，播放 {play_duration:.2f} 秒後結束。")
                 self.is_timed_playback = True
-                self.active_timer_thread = threading.Thread(target=self._timer_worker, args=(play_duration, target_scene_name, preview_target_scene_name))
-                self.active_timer_thread.start()
+                cancel_event = threading.Event()
+                self._timer_cancel = cancel_event
+                threading.Thread(target=self._timer_worker, args=(cancel_event, play_duration, target_scene_name, preview_target_scene_name)).start()
                 return
 
         self.is_timed_playback = False
-        print(f"   影片將完整播放，結束後由 OBS 事件觸發切換。")
\ No newline at end of file
+        log.info(f"   影片將完整播放，結束後由 OBS 事件觸發切換。")
\ No newline at end of file
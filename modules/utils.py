@@ -1,23 +1,49 @@
 """
 模組名稱: utils.py
 功能描述: 提供專案通用的工具類別與函式。
-          包含時間格式轉換 (TimeConverter) 等輔助功能。
+          包含時間格式轉換 (TimeConverter) 與非阻塞日誌設定等輔助功能。
 """
 
-from datetime import datetime
+import functools
+import logging
+import logging.handlers
+import queue
 from typing import Union
 
+def setup_queue_logging(name: str = "obs_events") -> logging.Logger:
+    """
+    建立非阻塞的 logger：訊息先進佇列，由背景監聽執行緒統一輸出到主控台。
+    熱路徑 (OBS 事件、播放流程) 只付出 queue.put 的成本，
+    不會因為主控台 flush 而卡住 websocket 處理。
+    """
+    logger = logging.getLogger(name)
+    if logger.handlers: # 已設定過就直接重用
+        return logger
+
+    log_queue = queue.Queue(-1)
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter("%(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, console)
+    listener.start()
+
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
 class TimeConverter:
     """一個專門處理時間格式轉換的工具類別"""
     @staticmethod
+    @functools.lru_cache(maxsize=1024)
     def to_seconds(time_str: str) -> Union[float, str]:
         """將 'HH:MM:SS.ms' 格式的字串轉為秒數 (float)。"""
         if time_str in ["full", "end"]:
             return time_str
-        try:
-            dt = datetime.strptime(time_str, "%H:%M:%S.%f")
-            return dt.hour * 3600 + dt.minute * 60 + dt.second + dt.microsecond / 1_000_000
-        except ValueError:
-            # 容錯處理：如果沒有微秒
-            dt = datetime.strptime(time_str, "%H:%M:%S")
-            return dt.hour * 3600 + dt.minute * 60 + dt.second
+        # 格式固定，直接手動拆解數字，比 datetime.strptime 快上數十倍
+        h, m, rest = time_str.split(":", 2)
+        s, _, frac = rest.partition(".")
+        seconds = int(h) * 3600 + int(m) * 60 + int(s)
+        if frac:
+            # 補滿微秒位數再截斷，支援任意長度的小數部分
+            return seconds + int(frac.ljust(6, "0")[:6]) / 1_000_000
+        return seconds
@@ -8,6 +8,18 @@ import json
 import os
 import random
 from typing import Dict, Any
+
+try:
+    # 優先使用 orjson (C 實作)，解析大型設定檔快上數倍
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    # 選用依賴：大型隨機池的洗牌改用 NumPy 的整數排列，比 random.shuffle 快數十倍
+    import numpy as np
+except ImportError:
+    np = None
 from .models import VideoSegment
 from .utils import TimeConverter
 
@@ -38,6 +50,8 @@ class VideoLibrary:
         # 初始化快取：預先建立標籤索引，確保查詢速度不受片段數量影響
         self._build_tag_cache()
         self._shuffle_pools = {} # 新增：洗牌池，用於確保隨機播放不重複
+        # NumPy 亂數產生器 (可重現性：測試時可改以固定種子建立)
+        self._rng = np.random.default_rng() if np is not None else None
 
     @property
     def settings(self) -> Dict[str, Any]:
@@ -47,17 +61,34 @@ class VideoLibrary:
     def _load_settings(self, json_path: str) -> Dict[str, Any]:
         """私有方法，負責讀取 JSON 設定檔。"""
         try:
-            with open(json_path, "r", encoding="utf-8") as f:
-                return json.load(f)
+            with open(json_path, "rb") as f:
+                raw = f.read()
+            if orjson is not None:
+                return orjson.loads(raw)
+            return json.loads(raw)
         except FileNotFoundError:
             print(f"❌ 錯誤：找不到設定檔 {json_path}")
             raise
-        except json.JSONDecodeError:
+        except ValueError:
+            # json.JSONDecodeError 與 orjson.JSONDecodeError 都是 ValueError 的子類
             print(f"❌ 錯誤：設定檔 {json_path} 格式不正確。")
             raise
 
+    def refresh_clips(self):
+        """重新掃描剪輯片段目錄，更新快取的檔名集合 (手動失效用)。"""
+        try:
+            self._clipped_files = set(os.listdir(self._clips_dir))
+        except OSError:
+            self._clipped_files = set()
+
     def _build_tag_cache(self):
-        """預先將所有片段依標籤分類，建立快取池 (Cache Pool)。"""
+        """
+        預先將所有片段依標籤分類，建立快取池 (Cache Pool)。
+        每個片段的 VideoSegment (原始檔與剪輯檔兩種版本) 也在此一次算好，
+        讓抽取時的熱路徑完全不必重跑時間解析與路徑組合。
+        """
+        # 一次列出剪輯目錄內容，之後查詢片段是否已剪輯時就不必再 stat 檔案系統
+        self.refresh_clips()
         self._tag_cache = {}
         total_segments = 0
         for video in self._videos:
@@ -65,12 +96,40 @@ class VideoLibrary:
             for tag_name, segments in tags.items():
                 if tag_name not in self._tag_cache:
                     self._tag_cache[tag_name] = []
-                
+
                 for seg in segments:
-                    self._tag_cache[tag_name].append((video, seg))
+                    self._tag_cache[tag_name].append(self._precompute_entry(video, seg))
                     total_segments += 1
         print(f"📊 快取建立完成: 共 {len(self._videos)} 部影片, {total_segments} 個片段。可用標籤: {list(self._tag_cache.keys())}")
 
+    def _precompute_entry(self, video: Dict[str, Any], seg: Dict[str, Any]) -> tuple:
+        """(私有方法) 為單一片段預先建立 VideoSegment 物件與剪輯檔名。"""
+        start_str = seg["start_time"]
+        end_str = seg["end_time"]
+        vol_mul = video.get("volume_multiplier", 1.0)
+        # _raw_dir / _clips_dir 在 __init__ 已是絕對路徑，直接 join 即可，
+        # 不必再走 os.path.abspath (每次呼叫都會 getcwd)
+        full_path = os.path.join(self._raw_dir, video["file_name"])
+        raw_segment = VideoSegment(
+            file_path=full_path,
+            start_time=TimeConverter.to_seconds(start_str),
+            end_time=TimeConverter.to_seconds(end_str),
+            volume_multiplier=vol_mul
+        )
+
+        # 若片段非完整影片，同時預先算好對應的剪輯檔版本
+        clipped_filename = None
+        clipped_segment = None
+        if start_str != "full":
+            file_root, _ = os.path.splitext(video["file_name"])
+            safe_start = start_str.replace(":", "-")
+            safe_end = end_str.replace(":", "-") if end_str not in ["full", "end"] else "end"
+            clipped_filename = f"{file_root}_{safe_start}_{safe_end}.mkv"
+            clipped_path = os.path.join(self._clips_dir, clipped_filename)
+            clipped_segment = VideoSegment(file_path=clipped_path, start_time="full", end_time="full", volume_multiplier=vol_mul)
+
+        return (video, clipped_filename, raw_segment, clipped_segment)
+
     def get_random_segment_by_tag(self, tag_type: str) -> VideoSegment:
         """
         公開方法，從設定檔中依標籤隨機抽取一個影片片段。
@@ -81,32 +140,28 @@ class VideoLibrary:
             raise ValueError(f"❌ 找不到任何包含標籤 '{tag_type}' 的影片")
 
         # 2. 使用洗牌池邏輯 (Shuffle Bag) 確保不重複播放
-        if tag_type not in self._shuffle_pools or not self._shuffle_pools[tag_type]:
-            print(f"🔀 重置標籤 '{tag_type}' 的隨機池 (共 {len(self._tag_cache[tag_type])} 個片段)")
-            pool = list(self._tag_cache[tag_type]) # 複製一份
-            random.shuffle(pool)
+        #    洗牌的是索引排列而非快取本身，重置時不必複製整份片段清單
+        cache = self._tag_cache[tag_type]
+        pool = self._shuffle_pools.get(tag_type)
+        if pool is None or pool[1] >= len(pool[0]):
+            print(f"🔀 重置標籤 '{tag_type}' 的隨機池 (共 {len(cache)} 個片段)")
+            if self._rng is not None:
+                indices = self._rng.permutation(len(cache)).astype(np.int32)
+            else:
+                indices = list(range(len(cache)))
+                random.shuffle(indices)
+            pool = [indices, 0]
             self._shuffle_pools[tag_type] = pool
-        
-        # 3. 從池子取出一個 (不放回)
-        chosen_video, chosen_segment = self._shuffle_pools[tag_type].pop()
-        print(f"🎲 從池中選取: {chosen_video['file_name']} (剩餘 {len(self._shuffle_pools[tag_type])} 個)")
-        
-        start_str = chosen_segment["start_time"]
-        end_str = chosen_segment["end_time"]
-        start_time = TimeConverter.to_seconds(start_str)
-        end_time = TimeConverter.to_seconds(end_str)
-        vol_mul = chosen_video.get("volume_multiplier", 1.0)
-        full_path = os.path.abspath(os.path.join(self._raw_dir, chosen_video["file_name"]))
+
+        # 3. 依游標取出下一個索引 (不放回)，直接回傳預先建立好的 VideoSegment
+        indices, cursor = pool
+        chosen_video, clipped_filename, raw_segment, clipped_segment = cache[int(indices[cursor])]
+        pool[1] = cursor + 1
+        print(f"🎲 從池中選取: {chosen_video['file_name']} (剩餘 {len(indices) - pool[1]} 個)")
 
         # 優先尋找並使用已剪輯的片段
-        if start_str != "full":
-            file_root, _ = os.path.splitext(os.path.basename(chosen_video["file_name"]))
-            safe_start = start_str.replace(":", "-")
-            safe_end = end_str.replace(":", "-") if end_str not in ["full", "end"] else "end"
-            clipped_filename = f"{file_root}_{safe_start}_{safe_end}.mkv"
-            clipped_path = os.path.abspath(os.path.join(self._clips_dir, clipped_filename))
-            if os.path.exists(clipped_path):
-                print(f"✨ 發現已剪輯片段，使用優化檔案: {clipped_filename}")
-                return VideoSegment(file_path=clipped_path, start_time="full", end_time="full", volume_multiplier=vol_mul)
+        if clipped_segment is not None and clipped_filename in self._clipped_files:
+            print(f"✨ 發現已剪輯片段，使用優化檔案: {clipped_filename}")
+            return clipped_segment
 
-        return VideoSegment(file_path=full_path, start_time=start_time, end_time=end_time, volume_multiplier=vol_mul)
\ No newline at end of file
+        return raw_segment
\ No newline at end of file
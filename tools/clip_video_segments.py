@@ -3,35 +3,48 @@
 功能描述: 自動化工具腳本。
           讀取 video_event.json 中的片段資訊，使用 ffmpeg 批次剪輯出獨立的 .mkv 檔案。
           支援 Fast Seek 與 CRF 高品質編碼。
+          流程分為兩階段：plan_jobs 純規劃片段清單，execute_jobs 負責實際剪輯。
 """
 
+import functools
 import json
 import os
 import subprocess
 import sys
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # 設定檔路徑 (指向專案根目錄的 video_event.json)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 JSON_PATH = os.path.join(BASE_DIR, "video_event.json")
 
+# 起點距離前一個關鍵影格在此容忍範圍內時，改用串流複製 (不重新編碼)
+KEYFRAME_TOLERANCE = 0.5
+
 class TimeParser:
     """處理時間格式轉換的工具"""
     @staticmethod
+    @functools.lru_cache(maxsize=None)
     def to_seconds(time_str):
-        """將 'HH:MM:SS.ms' 格式的字串轉為秒數 (float)。"""
+        """將 'HH:MM:SS.ms' 格式的字串轉為秒數 (float)。
+
+        同一時間字串常在多個標籤下重複出現，結果以 lru_cache 記住，
+        重複片段不再重新解析。
+
+        格式固定，手動切割整數即可，比 datetime.strptime 快一個數量級以上
+        (strptime 每次都要解析格式字串並配置 datetime 物件)。
+        """
         if time_str in ["full", "end"]:
             return 0.0
         try:
-            dt = datetime.strptime(time_str, "%H:%M:%S.%f")
-            return dt.hour * 3600 + dt.minute * 60 + dt.second + dt.microsecond / 1_000_000
-        except ValueError:
-            try:
-                dt = datetime.strptime(time_str, "%H:%M:%S")
-                return dt.hour * 3600 + dt.minute * 60 + dt.second
-            except ValueError:
-                print(f"⚠️ 無法解析時間格式: {time_str}")
-                return 0.0
+            h, m, rest = time_str.split(":", 2)
+            s, _, frac = rest.partition(".")
+            seconds = int(h) * 3600 + int(m) * 60 + int(s)
+            if frac:
+                seconds += int(frac.ljust(6, "0")[:6]) / 1_000_000
+            return seconds
+        except (ValueError, IndexError):
+            print(f"⚠️ 無法解析時間格式: {time_str}")
+            return 0.0
 
 def load_settings(path):
     if not os.path.exists(path):
@@ -40,52 +53,80 @@ def load_settings(path):
     with open(path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
-def process_videos():
-    print("🚀 開始批次剪輯與音量統一...")
-    
-    settings = load_settings(JSON_PATH)
-    path_config = settings["global_settings"]["path_config"]
-    
-    root_path = path_config.get("root", "./※素材")
-    abs_root = os.path.normpath(os.path.join(BASE_DIR, root_path))
-    
-    source_dir = os.path.join(abs_root, path_config["raw_videos"])
-    output_dir = os.path.join(abs_root, path_config["clips"])
-    
-    print(f"📂 原始影片目錄: {source_dir}")
-    print(f"📂 輸出片段目錄: {output_dir}")
+def probe_keyframes(input_path):
+    """使用 ffprobe 取得影片所有關鍵影格的時間點 (秒)。失敗時回傳 None。"""
+    # best_effort_timestamp_time 新舊版 ffprobe 都支援
+    # (pkt_pts_time 已在 ffmpeg 5.0 移除，指定它會拿到空輸出)
+    cmd = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v',
+        '-skip_frame', 'nokey', '-show_frames',
+        '-show_entries', 'frame=best_effort_timestamp_time',
+        '-of', 'csv=p=0', input_path
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        times = []
+        for line in result.stdout.splitlines():
+            # 只取第一個欄位 (N/A 或附加欄位一律略過)
+            value = line.strip().split(',', 1)[0]
+            if value:
+                try:
+                    times.append(float(value))
+                except ValueError:
+                    pass
+        return times or None
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
 
-    if not os.path.exists(source_dir):
-        print(f"❌ 原始影片目錄不存在: {source_dir}")
-        sys.exit(1)
+def ffmpeg_prefix():
+    """共用的 ffmpeg 命令前綴 (含探測參數調校)。
 
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-        print(f"📁 已建立輸出目錄: {output_dir}")
+    來源都是本機已知格式的檔案，不需要預設 5 秒的 analyzeduration
+    串流分析；-probesize 5MB 足以涵蓋 MKV 標頭。來源串流配置特殊時
+    可加 --safe-probe 參數還原 ffmpeg 的預設探測行為。
+    """
+    cmd = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', '-stats']
+    if "--safe-probe" not in sys.argv:
+        cmd.extend(['-probesize', '5000000', '-analyzeduration', '0'])
+    return cmd
 
-    videos = settings.get("videos", [])
-    processed_segments = set()
+def run_clip_job(cmd):
+    """執行單一 ffmpeg 剪輯指令 (在工作者執行緒中呼叫)。"""
+    subprocess.run(cmd, check=True)
+
+def plan_jobs(settings, source_dir, output_dir):
+    """第一階段 (純規劃)：展開設定檔中的所有片段，不執行任何 ffmpeg。
+
+    回傳 (plan, expected_files)：
+    - plan: 以來源檔名分組的片段清單 {file_name: [segment_dict, ...]}，
+      每個片段已算好秒數、長度與輸出路徑
+    - expected_files: 所有應存在的剪輯檔名集合 (供孤兒清理使用)
+    """
+    # 一次掃描來源目錄建立檔名集合，之後每部影片的存在檢查都是 O(1) 查表，
+    # 不必對每個 file_name 各發一次 stat
+    with os.scandir(source_dir) as it:
+        source_files = {entry.name for entry in it if entry.is_file()}
+
+    plan = {}
     expected_files = set()
+    processed_segments = set()
 
-    for video_info in videos:
+    for video_info in settings.get("videos", []):
         tags = video_info.get("tags", {})
         if not tags: continue
 
         file_name = video_info["file_name"]
-        input_path = os.path.join(source_dir, file_name)
-        
-        if not os.path.exists(input_path):
+        if file_name not in source_files:
             print(f"⚠️ 跳過找不到的檔案: {file_name}")
             continue
 
-        print(f"\n🎥 正在處理來源檔案: {file_name}")
         file_root, file_ext = os.path.splitext(file_name)
 
         for tag_name, segments in tags.items():
-            for i, segment in enumerate(segments):
+            for segment in segments:
                 start_str = segment["start_time"]
                 end_str = segment["end_time"]
-                
+
                 if start_str == "full":
                     print(f"   ⏭️  跳過完整影片設定 [{tag_name}] (full)")
                     continue
@@ -94,63 +135,161 @@ def process_videos():
                 if segment_key in processed_segments: continue
                 processed_segments.add(segment_key)
 
-                safe_start = start_str.replace(":", "-") if start_str != "full" else "start"
+                safe_start = start_str.replace(":", "-")
                 safe_end = end_str.replace(":", "-") if end_str not in ["full", "end"] else "end"
                 output_filename = f"{file_root}_{safe_start}_{safe_end}.mkv"
                 expected_files.add(output_filename)
-                output_path = os.path.join(output_dir, output_filename)
-
-                if os.path.exists(output_path):
-                    print(f"   ⏭️  檔案已存在，跳過: {output_filename}")
-                    continue
-                
-                print(f"   ✂️  剪輯片段 [{tag_name}]: {start_str} -> {end_str}")
-                cmd = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', '-stats']
-                start_seconds = 0.0
-                if start_str != "full":
-                    start_seconds = TimeParser.to_seconds(start_str)
-                
-                cmd.extend(['-i', input_path])
-                
-                # Slow Seek: -ss after -i (精確剪輯，解決畫面定格與起點不準問題)
-                if start_str != "full":
-                    cmd.extend(['-ss', start_str])
 
+                # 先一次算好起迄秒數與長度，無效片段不會進入執行階段
+                start_seconds = TimeParser.to_seconds(start_str)
+                duration = None
                 if end_str not in ["full", "end"]:
-                    end_seconds = TimeParser.to_seconds(end_str)
-                    duration = end_seconds - start_seconds
-                    if duration > 0: cmd.extend(['-t', str(duration)])
-                    else: continue
+                    duration = TimeParser.to_seconds(end_str) - start_seconds
+                    if duration <= 0: continue
+
+                plan.setdefault(file_name, []).append({
+                    "tag": tag_name,
+                    "start_str": start_str,
+                    "end_str": end_str,
+                    "start_seconds": start_seconds,
+                    "duration": duration,
+                    "exact": segment.get("exact", False),
+                    "output_filename": output_filename,
+                    "output_path": os.path.join(output_dir, output_filename),
+                })
+
+    return plan, expected_files
+
+def execute_jobs(plan, source_dir, pool_workers, threads_per):
+    """第二階段 (執行)：依規劃決定快速複製或重新編碼，平行執行 ffmpeg。"""
+    clip_jobs = [] # 所有 (cmd, 顯示名稱)，稍後交給執行緒池平行執行
+    keyframe_cache = {} # 每個來源檔只做一次 ffprobe 關鍵影格掃描
 
+    for file_name, jobs in plan.items():
+        input_path = os.path.join(source_dir, file_name)
+        print(f"\n🎥 正在處理來源檔案: {file_name}")
+        copy_outputs = []   # 此來源檔可串流複製的片段，稍後合併為單一 ffmpeg 呼叫
+        encode_outputs = [] # 此來源檔需要重新編碼的片段，稍後合併為單一 ffmpeg 呼叫
+
+        for job in jobs:
+            if os.path.exists(job["output_path"]):
+                print(f"   ⏭️  檔案已存在，跳過: {job['output_filename']}")
+                continue
+
+            # Fast Seek + 串流複製的快速路徑：起點貼齊關鍵影格時不需重新編碼
+            # (片段可設定 "exact": true 強制走重新編碼，確保逐格精準)
+            use_copy = False
+            if not job["exact"]:
+                if file_name not in keyframe_cache:
+                    keyframe_cache[file_name] = probe_keyframes(input_path)
+                keyframes = keyframe_cache[file_name]
+                if keyframes:
+                    start_seconds = job["start_seconds"]
+                    prev_kf = max((t for t in keyframes if t <= start_seconds + 1e-6), default=None)
+                    if prev_kf is not None and start_seconds - prev_kf <= KEYFRAME_TOLERANCE:
+                        use_copy = True
+
+            if use_copy:
+                print(f"   ⚡  快速剪輯 (關鍵影格對齊) [{job['tag']}]: {job['start_str']} -> {job['end_str']}")
+                copy_outputs.append(job)
+            else:
+                print(f"   ✂️  剪輯片段 [{job['tag']}]: {job['start_str']} -> {job['end_str']}")
+                encode_outputs.append(job)
+
+        # 同一來源檔的串流複製片段也合併為單一 ffmpeg 呼叫：
+        # 每個片段各帶一組 Fast Seek 輸入 (-ss 在 -i 前 + -c copy，零像素運算)，
+        # 把行程啟動成本攤在整個來源檔上，而非每個片段各付一次
+        if copy_outputs:
+            cmd = ffmpeg_prefix()
+            for job in copy_outputs:
+                cmd.extend(['-ss', job["start_str"], '-i', input_path])
+            for idx, job in enumerate(copy_outputs):
+                cmd.extend(['-map', str(idx)])
+                if job["duration"] is not None:
+                    cmd.extend(['-t', str(job["duration"])])
+                cmd.extend(['-c', 'copy', '-avoid_negative_ts', 'make_zero', job["output_path"]])
+            clip_jobs.append((cmd, f"{file_name} ({len(copy_outputs)} 個快速複製片段)"))
+
+        # 將此來源檔的所有重新編碼片段合併為「一次解碼、多組輸出」的單一 ffmpeg 呼叫，
+        # 省去每片段一次的行程啟動與解碼器初始化
+        if encode_outputs:
+            cmd = ffmpeg_prefix() + ['-i', input_path]
+            for job in encode_outputs:
+                # Slow Seek: 輸出端 -ss (精確剪輯，解決畫面定格與起點不準問題)
+                cmd.extend(['-ss', job["start_str"]])
+                if job["duration"] is not None:
+                    cmd.extend(['-t', str(job["duration"])])
                 cmd.extend([
-                    '-map', '0',
+                    '-map', '0', '-threads', str(threads_per),
                     '-c:v', 'libx264', '-crf', '18', '-preset', 'slow',
                     '-c:a', 'copy',
-                    output_path
+                    job["output_path"]
                 ])
-                
+            clip_jobs.append((cmd, f"{file_name} ({len(encode_outputs)} 個重新編碼片段)"))
+
+    # 平行執行所有剪輯工作
+    if clip_jobs:
+        print(f"\n🚀 以 {pool_workers} 個工作者平行剪輯 {len(clip_jobs)} 個片段 (每個 ffmpeg -threads {threads_per})...")
+        with ThreadPoolExecutor(max_workers=pool_workers) as pool:
+            futures = {pool.submit(run_clip_job, cmd): name for cmd, name in clip_jobs}
+            for future in as_completed(futures):
+                name = futures[future]
                 try:
-                    subprocess.run(cmd, check=True)
-                    print("      ✅ 完成")
+                    future.result()
+                    print(f"   ✅ 完成: {name}")
                 except subprocess.CalledProcessError as e:
-                    print(f"      ❌ ffmpeg 執行失敗: {e}")
+                    print(f"   ❌ ffmpeg 執行失敗 ({name}): {e}")
                 except FileNotFoundError:
-                    print("      ❌ 錯誤: 找不到 ffmpeg。")
-                    return
+                    print("   ❌ 錯誤: 找不到 ffmpeg。")
+
+def process_videos():
+    print("🚀 開始批次剪輯與音量統一...")
+
+    # 平行度設定：工作者數量可由 CLIP_WORKERS 覆寫，
+    # 每個 ffmpeg 限制 -threads，讓總執行緒數約等於 CPU 核心數，避免過度訂閱
+    pool_workers = int(os.environ.get("CLIP_WORKERS", max(1, (os.cpu_count() or 4) // 2)))
+    threads_per = max(1, (os.cpu_count() or pool_workers) // pool_workers)
+
+    settings = load_settings(JSON_PATH)
+    path_config = settings["global_settings"]["path_config"]
+
+    root_path = path_config.get("root", "./※素材")
+    abs_root = os.path.normpath(os.path.join(BASE_DIR, root_path))
 
-    # 8. 清理孤兒檔案 (不在 JSON 設定中的 .mkv 檔案)
+    source_dir = os.path.join(abs_root, path_config["raw_videos"])
+    output_dir = os.path.join(abs_root, path_config["clips"])
+
+    print(f"📂 原始影片目錄: {source_dir}")
+    print(f"📂 輸出片段目錄: {output_dir}")
+
+    if not os.path.exists(source_dir):
+        print(f"❌ 原始影片目錄不存在: {source_dir}")
+        sys.exit(1)
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        print(f"📁 已建立輸出目錄: {output_dir}")
+
+    plan, expected_files = plan_jobs(settings, source_dir, output_dir)
+    execute_jobs(plan, source_dir, pool_workers, threads_per)
+
+    # 清理孤兒檔案 (不在 JSON 設定中的 .mkv 檔案)
     print("\n🧹 開始清理舊片段...")
-    if os.path.exists(output_dir):
-        for filename in os.listdir(output_dir):
-            if filename.endswith(".mkv") and filename not in expected_files:
-                file_path = os.path.join(output_dir, filename)
-                try:
-                    os.remove(file_path)
-                    print(f"   🗑️  刪除孤兒檔案: {filename}")
-                except OSError as e:
-                    print(f"   ❌ 無法刪除檔案 {filename}: {e}")
+    if not expected_files:
+        # 設定檔中沒有任何片段時直接略過，避免誤刪整個輸出目錄
+        print("   ⏭️  未產生任何預期片段，跳過清理。")
+    elif os.path.exists(output_dir):
+        with os.scandir(output_dir) as it:
+            for entry in it:
+                if (entry.name.endswith(".mkv") and entry.name not in expected_files
+                        and entry.is_file(follow_symlinks=False)):
+                    try:
+                        os.remove(entry.path)
+                        print(f"   🗑️  刪除孤兒檔案: {entry.name}")
+                    except OSError as e:
+                        print(f"   ❌ 無法刪除檔案 {entry.name}: {e}")
 
     print("\n🎉 所有作業已完成！")
 
 if __name__ == "__main__":
-    process_videos()
\ No newline at end of file
+    process_videos()
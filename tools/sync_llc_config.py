@@ -13,32 +13,105 @@ python tools/sync_llc_config.py --reset
 import json
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import timedelta
-import locale
 import subprocess
 import sys
 
+try:
+    # 優先使用 orjson (C 實作)，解析設定檔與 LLC 檔快上數倍
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    # 選用依賴：以 PyAV + pyloudnorm 在行程內量測響度 (EBU R128)，
+    # 免去每個檔案一次的 ffmpeg 行程啟動與 stderr 日誌解析
+    import av
+    import numpy as np
+    import pyloudnorm
+except ImportError:
+    av = None
+
 # 設定檔路徑 (指向專案根目錄的 video_event.json)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 JSON_PATH = os.path.join(BASE_DIR, "video_event.json")
 
+# 響度量測快取：以「檔名:大小:mtime_ns」為鍵記錄原始 LUFS，
+# 檔案沒變就不必重跑完整解碼掃描 (改目標響度時只需算術換算)
+CACHE_PATH = os.path.join(BASE_DIR, ".llc_cache.json")
+
+def load_lufs_cache():
+    """讀取響度量測快取。不存在或損毀時回傳空快取。"""
+    try:
+        with open(CACHE_PATH, 'rb') as f:
+            return _loads(f.read())
+    except (OSError, ValueError):
+        return {}
+
+def save_lufs_cache(cache):
+    """原子寫入響度快取 (先寫 tmp 再 os.replace，避免中斷留下半份檔案)。"""
+    tmp_path = CACHE_PATH + ".tmp"
+    try:
+        if orjson is not None:
+            with open(tmp_path, 'wb') as f:
+                f.write(orjson.dumps(cache, option=orjson.OPT_INDENT_2))
+        else:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, CACHE_PATH)
+    except OSError as e:
+        print(f"⚠️ 無法寫入響度快取: {e}")
+
+def _loads(data):
+    """JSON 解碼：有 orjson 就走 C 實作，否則退回標準函式庫。"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 def load_json(path):
-    with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    with open(path, 'rb') as f:
+        return _loads(f.read())
 
-def save_json(path, data):
-    # 先轉成字串，使用標準縮排
-    json_str = json.dumps(data, indent=2, ensure_ascii=False)
-    
-    # 優化可讀性：將 start_time/end_time 壓縮成一行
-    pattern1 = r'\{\s*"start_time":\s*"([^"]+)",\s*"end_time":\s*"([^"]+)"\s*\}'
-    json_str = re.sub(pattern1, r'{ "start_time": "\1", "end_time": "\2" }', json_str, flags=re.DOTALL)
-    
-    pattern2 = r'\{\s*"end_time":\s*"([^"]+)",\s*"start_time":\s*"([^"]+)"\s*\}'
-    json_str = re.sub(pattern2, r'{ "start_time": "\2", "end_time": "\1" }', json_str, flags=re.DOTALL)
+def _dump_compact(obj, out, depth=0):
+    """(私有) 遞迴序列化 JSON，start_time/end_time 字典直接壓成一行。
 
+    一趟走訪直接寫進檔案控制代碼，取代原本「完整 dumps 後
+    再跑兩次整檔 re.sub」的三份全文字串配置。
+    """
+    indent = "  " * depth
+    child_indent = "  " * (depth + 1)
+    if isinstance(obj, dict):
+        if set(obj) == {"start_time", "end_time"}:
+            start = json.dumps(obj["start_time"], ensure_ascii=False)
+            end = json.dumps(obj["end_time"], ensure_ascii=False)
+            out.write(f'{{ "start_time": {start}, "end_time": {end} }}')
+        elif not obj:
+            out.write("{}")
+        else:
+            out.write("{\n")
+            for i, (key, value) in enumerate(obj.items()):
+                out.write(f'{child_indent}{json.dumps(key, ensure_ascii=False)}: ')
+                _dump_compact(value, out, depth + 1)
+                out.write(",\n" if i < len(obj) - 1 else "\n")
+            out.write(indent + "}")
+    elif isinstance(obj, list):
+        if not obj:
+            out.write("[]")
+        else:
+            out.write("[\n")
+            for i, value in enumerate(obj):
+                out.write(child_indent)
+                _dump_compact(value, out, depth + 1)
+                out.write(",\n" if i < len(obj) - 1 else "\n")
+            out.write(indent + "]")
+    else:
+        out.write(json.dumps(obj, ensure_ascii=False))
+
+def save_json(path, data):
+    # 優化可讀性：start_time/end_time 在序列化時就壓成一行
     with open(path, 'w', encoding='utf-8') as f:
-        f.write(json_str)
+        _dump_compact(data, f)
     print(f"💾 已寫入設定檔: {path}")
 
 def seconds_to_hms(seconds):
@@ -51,54 +124,120 @@ def seconds_to_hms(seconds):
     millis = int(td.microseconds / 1000)
     return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
 
+# 預先編譯 .llc 解析用的正規表示式 (模組載入時一次，掃描多個檔案時不必重編譯)
+_RE_MEDIA_FILE = re.compile(r"mediaFileName:\s*['\"](.+?)['\"]")
+_RE_SEGMENTS = re.compile(r"cutSegments:\s*\[(.*?)\]", re.DOTALL)
+_RE_BLOCK = re.compile(r"\{([^{}]+)\}")
+_RE_START = re.compile(r"start:\s*([\d\.]+)")
+_RE_END = re.compile(r"end:\s*([\d\.]+)")
+_RE_NAT = re.compile(r"(\d+)")
+
+def _natural_key(name):
+    """(私有) 自然排序鍵：把檔名切成文字與數字片段，數字以數值比較。"""
+    return [int(part) if part.isdigit() else part.lower() for part in _RE_NAT.split(name)]
+
 def parse_llc_content(content):
     """解析 .llc 檔案內容 (支援 JSON 與 JS Object 格式)。"""
-    try:
-        data = json.loads(content)
-        return data
-    except json.JSONDecodeError:
-        media_file_match = re.search(r"mediaFileName:\s*['\"](.+?)['\"]", content)
-        media_file_name = media_file_match.group(1) if media_file_match else None
-
-        segments = []
-        segments_match = re.search(r"cutSegments:\s*\[(.*?)\]", content, re.DOTALL)
-        if segments_match:
-            inner_content = segments_match.group(1)
-            segment_blocks = re.findall(r"\{([^{}]+)\}", inner_content)
-            
-            for block in segment_blocks:
-                start_match = re.search(r"start:\s*([\d\.]+)", block)
-                end_match = re.search(r"end:\s*([\d\.]+)", block)
-                
-                if start_match or end_match:
-                    start_val = float(start_match.group(1)) if start_match else 0.0
-                    end_val = float(end_match.group(1)) if end_match else None
-                    segments.append({"start": start_val, "end": end_val})
-        
-        return {"mediaFileName": media_file_name, "cutSegments": segments}
+    # 只有開頭像 JSON 才嘗試 json.loads；LLC 常見的 JS Object 格式
+    # 直接走正規表示式，省去必定失敗的解析與例外成本
+    if content.lstrip().startswith("{"):
+        try:
+            return _loads(content)
+        except ValueError:
+            # json.JSONDecodeError 與 orjson.JSONDecodeError 都是 ValueError 的子類
+            pass
 
-def get_volume_multiplier(file_path, target_lufs=-14.0):
-    """使用 ffmpeg 檢測影片響度，並計算達到目標 LUFS 所需的音量倍率。"""
+    media_file_match = _RE_MEDIA_FILE.search(content)
+    media_file_name = media_file_match.group(1) if media_file_match else None
+
+    segments = []
+    segments_match = _RE_SEGMENTS.search(content)
+    if segments_match:
+        # 只在 cutSegments 陣列的內文上跑區塊掃描，不再整份檔案重掃
+        for block in _RE_BLOCK.findall(segments_match.group(1)):
+            start_match = _RE_START.search(block)
+            end_match = _RE_END.search(block)
+
+            if start_match or end_match:
+                start_val = float(start_match.group(1)) if start_match else 0.0
+                end_val = float(end_match.group(1)) if end_match else None
+                segments.append({"start": start_val, "end": end_val})
+
+    return {"mediaFileName": media_file_name, "cutSegments": segments}
+
+def _measure_lufs_in_process(file_path):
+    """(私有) 以 PyAV 串流解碼音訊，用 pyloudnorm 計算整合響度 (LUFS)。"""
+    # R128 對多聲道是逐聲道加權加總能量，必須保留來源聲道配置量測；
+    # 先降混成 mono 會把典型立體聲內容低估約 3 dB，與 ffmpeg loudnorm 不一致
+    rate = 48000
+    chunks = []
+    with av.open(file_path) as container:
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format="fltp", layout=stream.layout.name, rate=rate)
+        for frame in container.decode(stream):
+            for out in resampler.resample(frame):
+                chunks.append(out.to_ndarray())
+    if not chunks:
+        return None
+    # planar 解碼為 (聲道, 樣本)，轉置成 pyloudnorm 要的 (樣本, 聲道)
+    samples = np.concatenate(chunks, axis=1).T
+    meter = pyloudnorm.Meter(rate)
+    return float(meter.integrated_loudness(samples))
+
+def measure_input_lufs(file_path, target_lufs=-14.0):
+    """量測影片的整合響度 (input_i, LUFS)。失敗時回傳 None。
+
+    優先走行程內解碼 (PyAV + pyloudnorm)，未安裝或解碼失敗時
+    退回原本的 ffmpeg loudnorm 掃描。
+    """
+    if av is not None:
+        try:
+            lufs = _measure_lufs_in_process(file_path)
+            if lufs is not None:
+                return lufs
+        except Exception as e:
+            print(f"⚠️ 行程內響度量測失敗，退回 ffmpeg {os.path.basename(file_path)}: {e}")
     try:
         cmd = [
             'ffmpeg', '-hide_banner', '-nostats',
+            '-threads', '1', # 平行分析時由執行緒池控制總量，單一 ffmpeg 不再多開執行緒
+            # 只需要音訊統計，不必花預設的 5MB/5 秒探測串流配置
+            '-probesize', '32k', '-analyzeduration', '0',
             '-i', file_path,
             '-vn', '-sn', '-dn',
             '-af', f'loudnorm=I={target_lufs}:TP=-1:print_format=json',
             '-f', 'null', '-'
         ]
-        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
-        json_match = re.search(r'\{.*"input_i".*\}', result.stderr, re.DOTALL)
-        if json_match:
-            data = json.loads(json_match.group(0))
-            input_i = float(data['input_i'])
-            print(f"      📊 偵測響度: {input_i} LUFS")
-            delta_db = target_lufs - input_i
-            multiplier = 10 ** (delta_db / 20)
-            return round(max(0.01, min(multiplier, 3.0)), 3)
+        # 以 1MB 管線緩衝一次讀完 stderr，避免預設小緩衝造成大量零碎 read() 系統呼叫
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE, bufsize=1 << 20)
+        stderr = proc.stderr.read().decode('utf-8', 'replace')
+        proc.wait()
+        # loudnorm 的 JSON 固定印在 stderr 尾端，從結尾往回定位括號即可，
+        # 不必用貪婪的 DOTALL 正規表示式對整段輸出回溯掃描
+        idx = stderr.rfind('"input_i"')
+        if idx != -1:
+            open_brace = stderr.rfind('{', 0, idx)
+            close_brace = stderr.find('}', idx)
+            if open_brace != -1 and close_brace != -1:
+                data = json.loads(stderr[open_brace:close_brace + 1])
+                return float(data['input_i'])
     except Exception as e:
         print(f"⚠️ 音量分析失敗 {os.path.basename(file_path)}: {e}")
-    return 1.0
+    return None
+
+def lufs_to_multiplier(input_i, target_lufs):
+    """由量測響度與目標響度計算音量倍率 (限制在 0.01 ~ 3.0)。"""
+    delta_db = target_lufs - input_i
+    return round(max(0.01, min(10 ** (delta_db / 20), 3.0)), 3)
+
+def get_volume_multiplier(file_path, target_lufs=-14.0):
+    """檢測影片響度，並計算達到目標 LUFS 所需的音量倍率。"""
+    input_i = measure_input_lufs(file_path, target_lufs)
+    if input_i is None:
+        return 1.0
+    print(f"      📊 偵測響度: {round(input_i, 1)} LUFS")
+    return lufs_to_multiplier(input_i, target_lufs)
 
 def update_video_event():
     force_recalc = "--reset" in sys.argv
@@ -142,54 +281,106 @@ def update_video_event():
 
     llc_data_map = {}
     if os.path.exists(llc_dir):
-        for filename in os.listdir(llc_dir):
-            if filename.endswith(".llc"):
+        # scandir 的 dirent 自帶型別資訊，不必對每個項目再 stat 一次
+        for entry in os.scandir(llc_dir):
+            if entry.is_file() and entry.name.endswith(".llc"):
                 try:
-                    with open(os.path.join(llc_dir, filename), 'r', encoding='utf-8') as f:
+                    with open(entry.path, 'r', encoding='utf-8') as f:
                         parsed = parse_llc_content(f.read())
-                        if parsed and parsed.get("mediaFileName"):
-                            llc_data_map[os.path.basename(parsed["mediaFileName"]).lower()] = parsed.get("cutSegments", [])
+                    if parsed and parsed.get("mediaFileName"):
+                        llc_data_map[os.path.basename(parsed["mediaFileName"]).lower()] = parsed.get("cutSegments", [])
                 except Exception as e:
-                    print(f"⚠️ 解析 LLC 檔案失敗 {filename}: {e}")
+                    print(f"⚠️ 解析 LLC 檔案失敗 {entry.name}: {e}")
 
     new_videos_list = []
     video_extensions = ('.mkv', '.mp4', '.mov', '.avi', '.webm')
     existing_videos = {v["file_name"]: v for v in current_data.get("videos", [])}
 
-    for filename in os.listdir(raw_video_dir):
-        if filename.lower().endswith(video_extensions):
-            print(f"🎥 處理影片: {filename}")
-            video_entry = {
-                "file_name": filename,
-                "tags": {"待機": [ { "start_time": "full", "end_time": "full" } ]}
+    # 一次 scandir 同時取得檔名與 stat 簽章 (大小 + mtime_ns)，
+    # 穩定狀態下整個掃描就只剩目錄列舉與查表
+    video_files = []
+    file_stats = {}
+    with os.scandir(raw_video_dir) as it:
+        for entry in it:
+            if entry.name.lower().endswith(video_extensions) and entry.is_file():
+                st = entry.stat()
+                video_files.append(entry.name)
+                file_stats[entry.name] = [st.st_size, st.st_mtime_ns]
+
+    # 先收集需要 (重新) 分析音量的檔案，交給執行緒池平行掃描
+    # (每個 ffmpeg 限制 -threads 1，總量由 pool 大小控制)；
+    # stat 簽章變了代表檔案內容已換，即使已有倍率也要重新量測
+    need_analysis = []
+    for f in video_files:
+        existing = existing_videos.get(f)
+        if (force_recalc or existing is None or "volume_multiplier" not in existing
+                or existing.get("_stat") != file_stats[f]):
+            need_analysis.append(f)
+    # 先查磁碟快取：檔案大小與 mtime 沒變就直接用快取的 LUFS 做算術換算，
+    # 只有新檔或內容變動的檔案才需要真正解碼量測
+    lufs_cache = load_lufs_cache()
+    volume_results = {}
+    pending = []
+    for f in need_analysis:
+        size, mtime_ns = file_stats[f]
+        cache_key = f"{f}:{size}:{mtime_ns}"
+        if cache_key in lufs_cache:
+            input_i = float(lufs_cache[cache_key])
+            volume_results[f] = lufs_to_multiplier(input_i, target_lufs)
+            print(f"   ⚡ 響度快取命中: {f} ({input_i} LUFS -> {volume_results[f]}x)")
+        else:
+            pending.append((f, cache_key))
+
+    if pending:
+        pool_size = min(8, os.cpu_count() or 4)
+        print(f"🔊 以 {pool_size} 個工作者平行分析 {len(pending)} 個檔案的音量...")
+        with ThreadPoolExecutor(max_workers=pool_size) as pool:
+            futures = {
+                pool.submit(measure_input_lufs, os.path.join(raw_video_dir, f), target_lufs): (f, key)
+                for f, key in pending
             }
-            
-            if not force_recalc and filename in existing_videos and "volume_multiplier" in existing_videos[filename]:
-                video_entry["volume_multiplier"] = existing_videos[filename]["volume_multiplier"]
-            else:
-                print(f"   🔊 正在分析原始影片音量...")
-                video_entry["volume_multiplier"] = get_volume_multiplier(os.path.join(raw_video_dir, filename), target_lufs)
-                print(f"      ↳ 建議音量倍率: {video_entry['volume_multiplier']}x")
-            
-            if filename.lower() in llc_data_map:
-                segments = llc_data_map[filename.lower()]
-                if segments:
-                    clip_segments = []
-                    for seg in segments:
-                        start_str = seconds_to_hms(seg.get("start", 0))
-                        end_str = seconds_to_hms(seg.get("end")) if seg.get("end") is not None else "end"
-                        clip_segments.append({"start_time": start_str, "end_time": end_str})
-                    if clip_segments:
-                        video_entry["tags"]["影片片段"] = clip_segments
-                        print(f"   ✅ 找到 {len(clip_segments)} 個剪輯片段")
-
-            new_videos_list.append(video_entry)
+            for future in as_completed(futures):
+                name, cache_key = futures[future]
+                input_i = future.result()
+                if input_i is None:
+                    volume_results[name] = 1.0
+                else:
+                    lufs_cache[cache_key] = input_i
+                    volume_results[name] = lufs_to_multiplier(input_i, target_lufs)
+                print(f"   ↳ {name} 建議音量倍率: {volume_results[name]}x")
+        save_lufs_cache(lufs_cache)
 
-    try:
-        locale.setlocale(locale.LC_COLLATE, '')
-        new_videos_list.sort(key=lambda x: locale.strxfrm(x['file_name']))
-    except (locale.Error, ImportError):
-        new_videos_list.sort(key=lambda x: x['file_name'])
+    for filename in video_files:
+        print(f"🎥 處理影片: {filename}")
+        video_entry = {
+            "file_name": filename,
+            "tags": {"待機": [ { "start_time": "full", "end_time": "full" } ]}
+        }
+
+        if filename in volume_results:
+            video_entry["volume_multiplier"] = volume_results[filename]
+        else:
+            video_entry["volume_multiplier"] = existing_videos[filename]["volume_multiplier"]
+        # 記錄 stat 簽章，下次執行時內容未變的檔案可直接沿用倍率
+        video_entry["_stat"] = file_stats[filename]
+
+        # 小寫鍵只算一次，get() 同時完成存在檢查與取值 (不必查表兩次)
+        segments = llc_data_map.get(filename.lower())
+        if segments:
+            clip_segments = []
+            for seg in segments:
+                start_str = seconds_to_hms(seg.get("start", 0))
+                end_str = seconds_to_hms(seg.get("end")) if seg.get("end") is not None else "end"
+                clip_segments.append({"start_time": start_str, "end_time": end_str})
+            if clip_segments:
+                video_entry["tags"]["影片片段"] = clip_segments
+                print(f"   ✅ 找到 {len(clip_segments)} 個剪輯片段")
+
+        new_videos_list.append(video_entry)
+
+    # 自然排序：數字片段以數值比較，"ep2" 會排在 "ep10" 之前
+    # (locale collation 無法做到，且排序鍵對每個元素只需計算一次)
+    new_videos_list.sort(key=lambda v: _natural_key(v['file_name']))
 
     current_data["videos"] = new_videos_list
     current_data["global_settings"]["_applied_audio_normalization"] = audio_norm_setting